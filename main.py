@@ -1,30 +1,39 @@
 from __future__ import annotations
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-import json, os, math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import Lock
+from typing import Optional, Dict, Any, Iterable, List, Tuple
+import json, os, hashlib, struct, zlib
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
 from nicegui import ui, app
-from fastapi.responses import JSONResponse, RedirectResponse
-from fastapi import Query
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from fastapi import Query, Request
+from starlette.middleware.gzip import GZipMiddleware
 
 # CONFIG
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 BUILDINGS_PATH = os.path.join(DATA_DIR, 'buildings.geojson')
 ROADS_PATH = os.path.join(DATA_DIR, 'roads.geojson')
-TRAFFIC_PATH = os.path.join(DATA_DIR, 'traffic_agg.geojson')
+ROADS_GEOM_PATH = os.path.join(DATA_DIR, 'roads_geom.json')
+ROADS_WKB_PATH = os.path.join(DATA_DIR, 'roads_geom.arrow')
+TRAFFIC_PATH = os.path.join(DATA_DIR, 'traffic_records.arrow')
 INTERVALS_PATH = os.path.join(DATA_DIR, 'intervals.json')
 STATIC_DIR = os.path.join(DATA_DIR, 'static')
 
-def sanitize_json(obj: Any) -> Any:
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    if isinstance(obj, dict):
-        return {k: sanitize_json(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [sanitize_json(x) for x in obj]
-    return obj
+class ORJSONResponse(Response):
+    """JSONResponse sérialisée par orjson (NaN/Inf -> null, types NumPy natifs)."""
+    media_type = 'application/json'
 
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+# les curseurs du client envoient toujours les mêmes bornes : on garde le résultat du parsing
+@lru_cache(maxsize=4096)
 def parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
     if not dt_str: return None
     s = str(dt_str).strip().replace(' ', 'T')
@@ -34,19 +43,12 @@ def parse_iso(dt_str: Optional[str]) -> Optional[datetime]:
     except Exception:
         return None
 
-def feature_in_range(feat, start, end):
-    p = feat.get('properties', {}) or {}
-    b = parse_iso(p.get('begin')) or parse_iso(p.get('start'))
-    e = parse_iso(p.get('end')) or b
-    if not b and not e: return False
-    if start and e and e < start: return False
-    if end and b and b > end: return False
-    return True
+EPOCH = datetime(1970, 1, 1)
+TS_MIN, TS_MAX = -(1 << 62), 1 << 62  # bornes "ouvertes" quand start/end sont absents
 
-def compute_min_max(features, var):
-    vals = [float(f["properties"].get(var, 0)) for f in features
-            if isinstance(f.get("properties", {}).get(var), (int, float))]
-    return {'min': min(vals) if vals else None, 'max': max(vals) if vals else None}
+def to_epoch(dt: datetime) -> int:
+    # les intervalles stockés sont naïfs : on ignore un éventuel fuseau client
+    return (dt.replace(tzinfo=None) - EPOCH) // timedelta(seconds=1)
 
 def safe_load_json(path, default):
     if not os.path.exists(path): return default
@@ -54,60 +56,436 @@ def safe_load_json(path, default):
 
 def safe_load_geojson(path): return safe_load_json(path, {'type':'FeatureCollection','features':[]})
 
+EMPTY_TRAFFIC = pa.table({
+    'id': pa.array([], pa.dictionary(pa.int32(), pa.string())),
+    'begin': pa.array([], pa.timestamp('s')),
+    'end': pa.array([], pa.timestamp('s')),
+})
+
+EMPTY_ROADS_WKB = pa.table({
+    'id': pa.array([], pa.string()),
+    'geometry': pa.array([], pa.binary()),
+})
+
+def safe_load_arrow(path, default: pa.Table) -> pa.Table:
+    """Table Arrow IPC ouverte en memory-map (lecture zero-copy, pages chargées à la demande)."""
+    if not os.path.exists(path): return default
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
 # --- charger les données
-BUILDINGS_GJ = safe_load_geojson(BUILDINGS_PATH)
-ROADS_GJ = safe_load_geojson(ROADS_PATH)
-TRAFFIC_GJ_ALL = safe_load_geojson(TRAFFIC_PATH)
-TRAFFIC_FEATURES_ALL = TRAFFIC_GJ_ALL.get('features', [])
+# les GeoJSON statiques ne sont que renvoyés : sérialisés une fois, les dicts Python ne restent pas en mémoire
+BUILDINGS_BYTES = orjson.dumps(safe_load_geojson(BUILDINGS_PATH))
+ROADS_BYTES = orjson.dumps(safe_load_geojson(ROADS_PATH))
+ROADS_GEOM = safe_load_json(ROADS_GEOM_PATH, {})
+ROADS_GEOM_BYTES = orjson.dumps(ROADS_GEOM)
+ROADS_WKB = safe_load_arrow(ROADS_WKB_PATH, EMPTY_ROADS_WKB)
+TRAFFIC_TABLE = safe_load_arrow(TRAFFIC_PATH, EMPTY_TRAFFIC)
 INTERVALS_RAW = safe_load_json(INTERVALS_PATH, {"intervals":[]})
 
 # === NOUVEAU: exposer la vraie liste des variables numériques ===
-def list_variables(example_feature: Dict[str, Any]) -> List[str]:
-    if not example_feature:
-        return []
-    props = example_feature.get('properties', {}) or {}
+def list_variables(schema: pa.Schema) -> List[str]:
     skip = {'id', 'begin', 'end', 'start'}
     out: List[str] = []
-    for k, v in props.items():
-        if k in skip:
+    for field in schema:
+        if field.name in skip:
             continue
-        if isinstance(v, (int, float)):
-            out.append(k)
+        if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            out.append(field.name)
     out.sort()
     return out
 
-TRAFFIC_VARS = list_variables(TRAFFIC_FEATURES_ALL[0] if TRAFFIC_FEATURES_ALL else {})
+TRAFFIC_VARS = list_variables(TRAFFIC_TABLE.schema)
+
+# === géométries : une par route, jointes aux enregistrements via le code dictionnaire de 'id' ===
+_ID_COL = TRAFFIC_TABLE.unify_dictionaries()['id']
+ROAD_IDS: List[str] = _ID_COL.chunk(0).dictionary.to_pylist() if _ID_COL.num_chunks else []
+ID_CODES = (np.concatenate([c.indices.to_numpy(zero_copy_only=False) for c in _ID_COL.chunks])
+            if _ID_COL.num_chunks else np.empty(0, dtype=np.int32))
+def pack_fragments(fragments: Iterable[bytes]) -> Tuple[memoryview, np.ndarray]:
+    """Fragments concaténés dans un seul buffer + offsets (fragment k = buf[off[k]:off[k+1]]) :
+    un bytes par fragment coûterait ~4 Ko de tampon orjson chacun, quelle que soit sa taille."""
+    buf, offsets = bytearray(), [0]
+    for f in fragments:
+        buf += f
+        offsets.append(len(buf))
+    return memoryview(bytes(buf)), np.asarray(offsets, dtype=np.int64)
+
+GEOM_BUF, GEOM_OFFSETS = pack_fragments(orjson.dumps(ROADS_GEOM.get(i)) for i in ROAD_IDS)
+del ROADS_GEOM
+# même alignement sur ROAD_IDS, en WKB, pour la sortie Arrow (le champ garde ses métadonnées GeoArrow)
+_WKB_BY_ID = dict(zip(ROADS_WKB['id'].to_pylist(), ROADS_WKB['geometry'].to_pylist()))
+GEOM_WKB_FIELD = ROADS_WKB.schema.field('geometry')
+GEOM_WKB = pa.array([_WKB_BY_ID.get(i) for i in ROAD_IDS], pa.binary())
+del _ID_COL, _WKB_BY_ID
+
+# une colonne float32 par variable (NaN pour les valeurs manquantes)
+# cast Arrow et réductions NumPy relâchent le GIL : une variable par thread au démarrage
+def _var_col(v: str) -> np.ndarray:
+    return TRAFFIC_TABLE[v].cast(pa.float32()).to_numpy()
+
+def _nan_min_max(col: np.ndarray) -> tuple:
+    return np.fmin.reduce(col, initial=np.nan), np.fmax.reduce(col, initial=np.nan)
+
+with ThreadPoolExecutor() as _ex:
+    VAR_COLS: Dict[str, np.ndarray] = dict(zip(TRAFFIC_VARS, _ex.map(_var_col, TRAFFIC_VARS)))
+    _GLOBAL_MIN_MAX = dict(zip(TRAFFIC_VARS, _ex.map(_nan_min_max, VAR_COLS.values())))
+JSON_DECIMALS = 2  # précision émise dans le JSON (les valeurs sont stockées en float32)
+
+def min_max_dict(mn: float, mx: float) -> Dict[str, Optional[float]]:
+    if np.isnan(mn) or np.isnan(mx): return {'min': None, 'max': None}
+    return {'min': round(float(mn), JSON_DECIMALS), 'max': round(float(mx), JSON_DECIMALS)}
+
+def compute_min_max(idx: np.ndarray, var: str) -> Dict[str, Optional[float]]:
+    col = VAR_COLS.get(var)
+    a = col[idx] if col is not None else np.empty(0)
+    a = a[~np.isnan(a)]
+    if not a.size: return {'min': None, 'max': None}
+    return min_max_dict(a.min(), a.max())
+
+# min/max sur toutes les lignes, par variable
+GLOBAL_STATS: Dict[str, Dict[str, Optional[float]]] = {v: min_max_dict(*mm) for v, mm in _GLOBAL_MIN_MAX.items()}
+del _GLOBAL_MIN_MAX
+
+# === index temporel : begin/end en secondes epoch (int64), trié par begin (calculé une fois) ===
+BEGIN_TS = TRAFFIC_TABLE['begin'].to_numpy().astype('datetime64[s]').view('int64')
+END_TS = TRAFFIC_TABLE['end'].to_numpy().astype('datetime64[s]').view('int64')
+ALL_INDICES = np.arange(TRAFFIC_TABLE.num_rows)
+# les lignes sans intervalle valide (NaT) ne sont jamais retournées par un filtre
+_NAT = np.datetime64('NaT', 's').view('int64')
+_VALID = np.flatnonzero((BEGIN_TS != _NAT) & (END_TS != _NAT))
+ORDER_BY_BEGIN = _VALID[np.argsort(BEGIN_TS[_VALID], kind='stable')]
+BEGIN_TS_SORTED = BEGIN_TS[ORDER_BY_BEGIN]
+del _NAT, _VALID
+# Quand les end sont croissants dans l'ordre des begin (pas de temps réguliers), une fenêtre
+# [s, e] sélectionne exactement la plage contiguë ORDER_BY_BEGIN[lo:hi].
+END_TS_SORTED = END_TS[ORDER_BY_BEGIN]
+ENDS_MONOTONE = bool(np.all(END_TS_SORTED[1:] >= END_TS_SORTED[:-1]))
+
+def filter_indices(s: int, e: int) -> np.ndarray:
+    """Indices des lignes dont [begin, end] recoupe [s, e] (secondes epoch)."""
+    cand = ORDER_BY_BEGIN[:np.searchsorted(BEGIN_TS_SORTED, e, side='right')]
+    return cand[END_TS[cand] >= s]
+
+# === plage (lo, hi) dans ORDER_BY_BEGIN pour chaque intervalle distinct (pas à pas de la timeline) ===
+# deux searchsorted vectorisés : O(P log N) ; sans end monotones, pas de plage contiguë -> pas de table
+if ENDS_MONOTONE:
+    # (begin, end) déjà triés : les paires distinctes sont les ruptures de séquence
+    _NEW = np.ones(len(BEGIN_TS_SORTED), dtype=bool)
+    _NEW[1:] = (BEGIN_TS_SORTED[1:] != BEGIN_TS_SORTED[:-1]) | (END_TS_SORTED[1:] != END_TS_SORTED[:-1])
+    _PAIRS = np.column_stack([BEGIN_TS_SORTED[_NEW], END_TS_SORTED[_NEW]])
+    BY_INTERVAL: Dict[tuple, tuple] = dict(zip(
+        map(tuple, _PAIRS.tolist()),
+        zip(np.searchsorted(END_TS_SORTED, _PAIRS[:, 0], side='left').tolist(),
+            np.searchsorted(BEGIN_TS_SORTED, _PAIRS[:, 1], side='right').tolist())))
+    del _NEW, _PAIRS
+else:
+    BY_INTERVAL = {}
+
+def filter_rows(start: Optional[str], end: Optional[str]) -> np.ndarray:
+    dt_start, dt_end = parse_iso(start), parse_iso(end)
+    if not (dt_start or dt_end):
+        return ALL_INDICES
+    s = to_epoch(dt_start) if dt_start else TS_MIN
+    e = to_epoch(dt_end) if dt_end else TS_MAX
+    hit = BY_INTERVAL.get((s, e))
+    return ORDER_BY_BEGIN[hit[0]:hit[1]] if hit is not None else filter_indices(s, e)
+
+# === min/max par plage : table creuse (sparse table) sur des blocs de lignes triées par begin ===
+class RangeMinMax:
+    """min/max (NaN ignorés) de values[lo:hi] : O(1) sur les blocs complets, au plus 2 blocs partiels scannés."""
+    BLOCK = 1024
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        starts = np.arange(0, len(values), self.BLOCK)
+        self.mins = [np.fmin.reduceat(values, starts) if len(values) else values[:0]]
+        self.maxs = [np.fmax.reduceat(values, starts) if len(values) else values[:0]]
+        # niveau k : min/max de 2**k blocs consécutifs
+        k = 1
+        while (1 << k) <= len(starts):
+            half = 1 << (k - 1)
+            self.mins.append(np.fmin(self.mins[-1][:-half], self.mins[-1][half:]))
+            self.maxs.append(np.fmax(self.maxs[-1][:-half], self.maxs[-1][half:]))
+            k += 1
+
+    def query(self, lo: int, hi: int) -> tuple:
+        bl, br = -(-lo // self.BLOCK), hi // self.BLOCK  # blocs entièrement inclus : [bl, br)
+        if bl >= br:
+            a = self.values[lo:hi]
+            return np.fmin.reduce(a, initial=np.nan), np.fmax.reduce(a, initial=np.nan)
+        k = (br - bl).bit_length() - 1
+        j = br - (1 << k)
+        head, tail = self.values[lo:bl * self.BLOCK], self.values[br * self.BLOCK:hi]
+        mn = np.fmin(np.fmin(self.mins[k][bl], self.mins[k][j]),
+                     np.fmin(np.fmin.reduce(head, initial=np.nan), np.fmin.reduce(tail, initial=np.nan)))
+        mx = np.fmax(np.fmax(self.maxs[k][bl], self.maxs[k][j]),
+                     np.fmax(np.fmax.reduce(head, initial=np.nan), np.fmax.reduce(tail, initial=np.nan)))
+        return mn, mx
+
+RANGE_MIN_MAX: Dict[str, RangeMinMax] = (
+    {v: RangeMinMax(VAR_COLS[v][ORDER_BY_BEGIN]) for v in TRAFFIC_VARS} if ENDS_MONOTONE else {}
+)
+
+def window_min_max(start: Optional[str], end: Optional[str], var: str) -> Dict[str, Optional[float]]:
+    dt_start, dt_end = parse_iso(start), parse_iso(end)
+    if not (dt_start or dt_end) and var in GLOBAL_STATS:
+        return dict(GLOBAL_STATS[var])
+    rmm = RANGE_MIN_MAX.get(var)
+    if rmm is None or not (dt_start or dt_end):
+        return compute_min_max(filter_rows(start, end), var)
+    lo = np.searchsorted(END_TS_SORTED, to_epoch(dt_start), side='left') if dt_start else 0
+    hi = np.searchsorted(BEGIN_TS_SORTED, to_epoch(dt_end), side='right') if dt_end else len(ORDER_BY_BEGIN)
+    return min_max_dict(*rmm.query(int(lo), int(hi)))
+
+def read_properties(idx: np.ndarray) -> List[Dict[str, Any]]:
+    """Propriétés des lignes idx, en ne lisant que les colonnes utiles."""
+    sub = TRAFFIC_TABLE.take(idx)
+    for col in ('begin', 'end'):
+        sub = sub.set_column(sub.schema.get_field_index(col), col, pc.strftime(sub[col], format='%Y-%m-%dT%H:%M:%S'))
+    # float32 -> float64 arrondi, sinon 6.84 sortirait en 6.840000152587891
+    for v in TRAFFIC_VARS:
+        sub = sub.set_column(sub.schema.get_field_index(v), v, pc.round(sub[v].cast(pa.float64()), ndigits=JSON_DECIMALS))
+    return sub.to_pylist()
+
+# === propriétés de chaque ligne sérialisées une fois : une réponse n'est plus qu'une concaténation d'octets ===
+PROPS_BATCH = 65536  # lignes converties en dicts Python à la fois (borne le pic mémoire au démarrage)
+
+def _props_fragments() -> Iterable[bytes]:
+    for lo in range(0, len(ALL_INDICES), PROPS_BATCH):
+        for p in read_properties(ALL_INDICES[lo:lo + PROPS_BATCH]):
+            yield orjson.dumps(p)
+
+PROPS_BUF, PROPS_OFFSETS = pack_fragments(_props_fragments())
+
+def features_json(idx: np.ndarray) -> bytes:
+    # géométrie par route et propriétés par ligne déjà sérialisées : on les insère telles quelles
+    codes = ID_CODES[idx]
+    return b','.join([b'{"type":"Feature","geometry":%s,"properties":%s}' % (GEOM_BUF[a:b], PROPS_BUF[c:d])
+                      for a, b, c, d in zip(GEOM_OFFSETS[codes].tolist(), GEOM_OFFSETS[codes + 1].tolist(),
+                                            PROPS_OFFSETS[idx].tolist(), PROPS_OFFSETS[idx + 1].tolist())])
+
+def feature_collection_json(idx: np.ndarray, meta: Dict[str, Any]) -> bytes:
+    return b'{"type":"FeatureCollection","features":[%s],"meta":%s}' % (features_json(idx), orjson.dumps(meta))
+
+def records_json(idx: np.ndarray, meta: Dict[str, Any]) -> bytes:
+    recs = b','.join([PROPS_BUF[c:d] for c, d in zip(PROPS_OFFSETS[idx].tolist(), PROPS_OFFSETS[idx + 1].tolist())])
+    return b'{"records":[%s],"meta":%s}' % (recs, orjson.dumps(meta))
+
+ARROW_STREAM_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+def arrow_stream_bytes(idx: np.ndarray, meta: Dict[str, Any]) -> bytes:
+    """Lignes idx en flux Arrow IPC : colonnes prises telles quelles + géométrie WKB (GeoArrow)."""
+    table = TRAFFIC_TABLE.take(idx).append_column(GEOM_WKB_FIELD, GEOM_WKB.take(ID_CODES[idx]))
+    table = table.replace_schema_metadata({'meta': orjson.dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def body_etag(body: bytes) -> str:
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+# === réponse "sans filtre temporel" pré-sérialisée : un seul blob de features partagé,
+# seul le préfixe (meta) dépend de la variable ===
+FULL_CACHE_CONTROL = 'public, max-age=300'
+FULL_FEATURES: bytes = features_json(ALL_INDICES)
+FULL_SUFFIX = b']}'
+FULL_PREFIX_BY_VAR: Dict[str, bytes] = {
+    v: b'{"type":"FeatureCollection","meta":%s,"features":[' % orjson.dumps(GLOBAL_STATS[v]) for v in TRAFFIC_VARS
+}
+_FULL_FEATURES_DIGEST = hashlib.blake2b(FULL_FEATURES, digest_size=16).digest()
+FULL_ETAG_BY_VAR: Dict[str, str] = {v: body_etag(p + _FULL_FEATURES_DIGEST) for v, p in FULL_PREFIX_BY_VAR.items()}
+
+def full_body(var: str) -> tuple:
+    """Morceaux de la réponse complète pour var (envoyés tels quels, jamais concaténés)."""
+    return FULL_PREFIX_BY_VAR[var], FULL_FEATURES, FULL_SUFFIX
+
+# === même réponse, gzip précalculé : le blob partagé est compressé une fois en deflate brut terminé
+# par un sync flush (aligné, non final), chaque variable n'ajoute que son en-tête et sa fin ===
+GZIP_LEVEL = 1               # compression à la volée (middleware) : coût CPU minimal par requête
+GZIP_PRECOMPUTED_LEVEL = 1   # niveau 6 : ~20 % plus petit mais 3x plus lent au démarrage (5.8 s vs 1.7 s sur 260 Mo)
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+def _deflate(data: bytes, final: bool) -> bytes:
+    c = zlib.compressobj(GZIP_PRECOMPUTED_LEVEL, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def _gf2_times(mat: List[int], vec: int) -> int:
+    out, i = 0, 0
+    while vec:
+        if vec & 1: out ^= mat[i]
+        vec >>= 1; i += 1
+    return out
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """CRC32 de A+B à partir de crc(A), crc(B) et len(B), sans relire les données (zlib crc32_combine)."""
+    if len2 <= 0: return crc1
+    odd = [0xEDB88320] + [1 << n for n in range(31)]   # opérateur « un bit nul »
+    even = [_gf2_times(odd, m) for m in odd]           # 2 bits
+    odd = [_gf2_times(even, m) for m in even]          # 4 bits
+    while True:
+        even = [_gf2_times(odd, m) for m in odd]
+        if len2 & 1: crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2: break
+        odd = [_gf2_times(even, m) for m in even]
+        if len2 & 1: crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2: break
+    return crc1 ^ crc2
+
+FULL_FEATURES_GZ = _deflate(FULL_FEATURES, final=False)
+_FULL_FEATURES_CRC = zlib.crc32(FULL_FEATURES)
+
+def _gzip_parts(prefix: bytes) -> tuple:
+    crc = crc32_combine(crc32_combine(zlib.crc32(prefix), _FULL_FEATURES_CRC, len(FULL_FEATURES)),
+                        zlib.crc32(FULL_SUFFIX), len(FULL_SUFFIX))
+    size = len(prefix) + len(FULL_FEATURES) + len(FULL_SUFFIX)
+    return (_GZIP_HEADER + _deflate(prefix, final=False), FULL_FEATURES_GZ,
+            _deflate(FULL_SUFFIX, final=True) + struct.pack('<II', crc, size & 0xFFFFFFFF))
+
+FULL_GZ_BY_VAR: Dict[str, tuple] = {v: _gzip_parts(p) for v, p in FULL_PREFIX_BY_VAR.items()}
+
+def check_full_gzip(var: str, piece: int = 1 << 20) -> None:
+    """Décompresse FULL_GZ_BY_VAR[var] en flux (CRC et taille vérifiés par zlib) et compare à full_body(var)."""
+    d, got, want = zlib.decompressobj(16 + zlib.MAX_WBITS), hashlib.blake2b(), hashlib.blake2b()
+    for chunk in full_body(var):
+        want.update(chunk)
+    for chunk in FULL_GZ_BY_VAR[var]:
+        data = memoryview(chunk)
+        for i in range(0, len(data), piece):
+            buf = data[i:i + piece]
+            while buf:
+                got.update(d.decompress(buf, piece))
+                buf = d.unconsumed_tail
+    if not d.eof or d.unused_data or got.digest() != want.digest():
+        raise RuntimeError(f'gzip précalculé invalide pour {var}')
+
+# le blob deflate et le calcul de CRC sont partagés : une variable suffit
+for _v in TRAFFIC_VARS[:1]:
+    check_full_gzip(_v)
+
+def accepts_gzip(request: Request) -> bool:
+    """gzip accepté avec q > 0 (explicitement ou via *), cf. RFC 9110 §12.5.3."""
+    q_by_coding: Dict[str, float] = {}
+    for item in request.headers.get('accept-encoding', '').lower().split(','):
+        coding, _, params = item.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            k, _, val = param.strip().partition('=')
+            if k == 'q':
+                try:
+                    q = float(val)
+                except ValueError:
+                    q = 0.0
+        if coding.strip():
+            q_by_coding[coding.strip()] = q
+    q = q_by_coding.get('gzip', q_by_coding.get('x-gzip', q_by_coding.get('*', 0.0)))
+    return q > 0
+
+def cached_json_response(request: Request, body, etag: str, cache_control: str,
+                         media_type: str = 'application/json', encoding: Optional[str] = None) -> Response:
+    """body : bytes, ou tuple de morceaux bytes envoyés en streaming sans copie ;
+    encoding : body déjà compressé (le middleware gzip ne le retouche pas)."""
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if encoding:
+        headers.update({'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'})
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    if isinstance(body, tuple):
+        headers['Content-Length'] = str(sum(map(len, body)))
+        return StreamingResponse(iter(body), media_type=media_type, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+# === cache LRU des réponses filtrées : le scrubbing de la timeline rejoue souvent les mêmes paramètres ===
+RESPONSE_CACHE_SIZE = 256                     # entrées au plus
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024   # et octets au plus, tous corps confondus
+RESPONSE_CACHE_MAX_BODY = RESPONSE_CACHE_MAX_BYTES // 8  # au-delà, le corps n'est pas gardé
+RESPONSE_CACHE_CONTROL = 'private, max-age=60'
+RESPONSE_CACHE: 'OrderedDict[tuple, tuple]' = OrderedDict()  # clé -> (body, etag)
+_RESPONSE_CACHE_BYTES = 0
+_RESPONSE_CACHE_LOCK = Lock()  # endpoints sync servis par un pool de threads
+
+def response_key(kind: str, start: Optional[str], end: Optional[str], var: str, fmt: str = 'geojson') -> tuple:
+    """Clé normalisée : bornes en epoch (même fenêtre quelle que soit l'écriture de la date),
+    variable inconnue ramenée à None (même réponse), fmt restreint aux formats servis."""
+    dt_start, dt_end = parse_iso(start), parse_iso(end)
+    return (kind, to_epoch(dt_start) if dt_start else None, to_epoch(dt_end) if dt_end else None,
+            var if var in VAR_COLS else None, 'arrow' if fmt == 'arrow' else 'geojson')
+
+def cached_body(key: tuple, build) -> tuple:
+    """(body, etag) pour key ; build() n'est appelé qu'en cas d'absence du cache."""
+    global _RESPONSE_CACHE_BYTES
+    with _RESPONSE_CACHE_LOCK:
+        hit = RESPONSE_CACHE.get(key)
+        if hit is not None:
+            RESPONSE_CACHE.move_to_end(key)
+            return hit
+    body = build()
+    hit = (body, body_etag(body))
+    if len(body) > RESPONSE_CACHE_MAX_BODY or (key[1] is None and key[2] is None):
+        return hit  # trop gros, ou sans borne (toutes les lignes) : recalculé à chaque fois
+    with _RESPONSE_CACHE_LOCK:
+        old = RESPONSE_CACHE.pop(key, None)
+        if old is not None:
+            _RESPONSE_CACHE_BYTES -= len(old[0])
+        RESPONSE_CACHE[key] = hit
+        _RESPONSE_CACHE_BYTES += len(body)
+        while len(RESPONSE_CACHE) > RESPONSE_CACHE_SIZE or _RESPONSE_CACHE_BYTES > RESPONSE_CACHE_MAX_BYTES:
+            _RESPONSE_CACHE_BYTES -= len(RESPONSE_CACHE.popitem(last=False)[1][0])
+    return hit
 
 # --- API
 @app.get('/api/map/buildings')
-def api_buildings(): return JSONResponse(BUILDINGS_GJ)
+def api_buildings(): return Response(BUILDINGS_BYTES, media_type='application/json')
 
 @app.get('/api/map/roads')
-def api_roads(): return JSONResponse(ROADS_GJ)
+def api_roads(): return Response(ROADS_BYTES, media_type='application/json')
+
+@app.get('/api/map/roads/geom')
+def api_roads_geom(): return Response(ROADS_GEOM_BYTES, media_type='application/json')
 
 @app.get('/api/map/traffic')
-def api_traffic(start:Optional[str]=None, end:Optional[str]=None, var:str='vehicles', scope:str='filtered'):
-    dt_start, dt_end = parse_iso(start), parse_iso(end)
-    feats = [f for f in TRAFFIC_FEATURES_ALL if feature_in_range(f, dt_start, dt_end)] if (dt_start or dt_end) else TRAFFIC_FEATURES_ALL
-    stats = compute_min_max(feats, var)
-    return JSONResponse({'type':'FeatureCollection','features':feats,'meta':{'min':stats['min'],'max':stats['max']}})
+def api_traffic(request:Request, start:Optional[str]=None, end:Optional[str]=None, var:str='vehicles', scope:str='filtered', fmt:str='geojson'):
+    key = response_key('traffic', start, end, var, fmt)
+    var = key[3]
+    if key[4] == 'arrow':
+        body, etag = cached_body(key, lambda: arrow_stream_bytes(filter_rows(start, end), window_min_max(start, end, var)))
+        return cached_json_response(request, body, etag, RESPONSE_CACHE_CONTROL, ARROW_STREAM_MEDIA_TYPE)
+    if key[1] is None and key[2] is None and var in FULL_PREFIX_BY_VAR:
+        if accepts_gzip(request):
+            # ETag distinct par encodage (représentations différentes)
+            return cached_json_response(request, FULL_GZ_BY_VAR[var], FULL_ETAG_BY_VAR[var][:-1] + '-gz"',
+                                        FULL_CACHE_CONTROL, encoding='gzip')
+        return cached_json_response(request, full_body(var), FULL_ETAG_BY_VAR[var], FULL_CACHE_CONTROL)
+    def build() -> bytes:
+        stats = window_min_max(start, end, var)
+        return feature_collection_json(filter_rows(start, end), {'min':stats['min'],'max':stats['max']})
+    body, etag = cached_body(key, build)
+    return cached_json_response(request, body, etag, RESPONSE_CACHE_CONTROL)
+
+@app.get('/api/map/traffic/records')
+def api_traffic_records(start:Optional[str]=None, end:Optional[str]=None, var:str='vehicles'):
+    # variante sans géométrie : à combiner avec /api/map/roads/geom chargé une seule fois
+    idx = filter_rows(start, end)
+    return Response(records_json(idx, window_min_max(start, end, var)), media_type='application/json')
 
 @app.get('/api/map/traffic/minmax')
-def api_traffic_minmax(var:str='vehicles', start:Optional[str]=None, end:Optional[str]=None, scope:str='filtered'):
-    dt_start, dt_end = parse_iso(start), parse_iso(end)
-    feats = [f for f in TRAFFIC_FEATURES_ALL if feature_in_range(f, dt_start, dt_end)] if (dt_start or dt_end) else TRAFFIC_FEATURES_ALL
-    return JSONResponse(compute_min_max(feats, var))
+def api_traffic_minmax(request:Request, var:str='vehicles', start:Optional[str]=None, end:Optional[str]=None, scope:str='filtered'):
+    key = response_key('minmax', start, end, var)
+    body, etag = cached_body(key, lambda: orjson.dumps(window_min_max(start, end, key[3])))
+    return cached_json_response(request, body, etag, RESPONSE_CACHE_CONTROL)
 
 @app.get('/api/map/traffic/intervals')
 def api_traffic_intervals():
     if INTERVALS_RAW.get("intervals"):
-        return JSONResponse({'intervals': INTERVALS_RAW["intervals"]})
-    return JSONResponse({'intervals': []})
+        return ORJSONResponse({'intervals': INTERVALS_RAW["intervals"]})
+    return ORJSONResponse({'intervals': []})
 
 # === NOUVEAU: endpoint pour la liste des variables ===
 @app.get('/api/map/traffic/vars')
 def api_traffic_vars():
-    return JSONResponse({'variables': TRAFFIC_VARS})
+    return ORJSONResponse({'variables': TRAFFIC_VARS})
 
 # static & root
 app.add_static_files('/static', STATIC_DIR)
@@ -116,4 +494,7 @@ app.add_static_files('/static', STATIC_DIR)
 def root(): return RedirectResponse(url='/static/map_deck.html?v=23')
 
 if __name__ in {"__main__", "__mp_main__"}:
-    ui.run(title='Carte Trafic & Bruit', port=8080, reload=True)
+    # GeoJSON très redondant : gzip niveau 1 divise la taille transférée par 5-10 pour un coût CPU faible
+    # (NiceGUI installe lui-même le middleware gzip : on le configure ici plutôt que d'en empiler un second)
+    ui.run(title='Carte Trafic & Bruit', port=8080, reload=True,
+           gzip_middleware_factory=lambda a: GZipMiddleware(a, minimum_size=1024, compresslevel=GZIP_LEVEL))
@@ -2,10 +2,11 @@
 import json
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+import shapely
 from shapely import from_wkb
-from shapely.geometry import mapping
-from shapely.ops import transform as shp_transform
 from pyproj import Transformer
 
 # ========= CONFIG =========
@@ -16,6 +17,11 @@ TRAFFIC_PARQUET = "traffic_res.parquet"
 BUILDINGS_OUT = "buildings.geojson"
 ROADS_OUT = "roads.geojson"
 TRAFFIC_OUT = "traffic_agg.geojson"
+ROADS_GEOM_OUT = "roads_geom.json"   # id route -> géométrie (une seule fois par route)
+ROADS_WKB_OUT = "roads_geom.arrow"   # id route -> géométrie WKB (GeoArrow)
+TRAFFIC_RECORDS_OUT = "traffic_records.arrow"   # enregistrements trafic sans géométrie, lus en memory-map par main.py
+TRAFFIC_RECORDS_PARQUET_OUT = "traffic.parquet"   # mêmes enregistrements, triés par begin, pour les lectures filtrées
+TRAFFIC_ROW_GROUP_SIZE = 65536
 INTERVALS_OUT = "intervals.json"   # <<< NEW
 
 SRC_EPSG = 3003
@@ -23,29 +29,62 @@ DST_EPSG = 4326
 TRANSFORMER = Transformer.from_crs(SRC_EPSG, DST_EPSG, always_xy=True)
 
 # ========= UTILITAIRES =========
-def reproject_geom(geom):
-    return shp_transform(lambda x, y, z=None: TRANSFORMER.transform(x, y), geom)
-
-def decode_wkb_to_geojson_features(df, id_col, geom_col, extra_props=None, reproject=True):
-    features = []
-    extra_props = extra_props or []
-    for _, row in df.iterrows():
-        if pd.isna(row[geom_col]):
-            continue
-        g = from_wkb(row[geom_col])
-        if g is None:
-            continue
-        if reproject:
-            g = reproject_geom(g)
-        props = {id_col: row[id_col]}
-        for p in extra_props:
-            props[p] = row[p]
-        features.append({"type": "Feature", "geometry": mapping(g), "properties": props})
-    return {"type": "FeatureCollection", "features": features}
+def reproject_geoms(geoms: np.ndarray) -> np.ndarray:
+    # un seul appel PROJ sur toutes les coordonnées à plat, puis redistribution par géométrie
+    coords = shapely.get_coordinates(geoms)
+    xs, ys = TRANSFORMER.transform(coords[:, 0], coords[:, 1])
+    return shapely.set_coordinates(geoms.copy(), np.column_stack([xs, ys]))
+
+def decode_geoms(df, geom_col, reproject=True):
+    df = df[df[geom_col].notna()]
+    # décodage WKB vectorisé (un seul appel GEOS) ; on écarte les géométries nulles ou vides
+    geoms = from_wkb(df[geom_col].to_numpy())
+    keep = ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+    df, geoms = df[keep], geoms[keep]
+    if reproject:
+        geoms = reproject_geoms(geoms)
+    return df, geoms
+
+def column_records(df, keys):
+    # colonnes en listes Python, sans iterrows() ; NaN -> None en amont pour écrire null, jamais NaN
+    sub = df[keys].astype(object)
+    sub = sub.where(sub.notna(), None)
+    return [dict(zip(keys, vals)) for vals in zip(*(sub[c].tolist() for c in keys))]
 
 def write_json(path, obj):
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False)
+        json.dump(obj, f, ensure_ascii=False, allow_nan=False)
+
+def write_feature_collection(path, geoms_json, props):
+    # geoms_json : fragments GeoJSON déjà sérialisés (shapely.to_geojson), insérés tels quels
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"type": "FeatureCollection", "features": [')
+        f.write(", ".join(
+            '{"type": "Feature", "geometry": %s, "properties": %s}' % (g or "null", json.dumps(p, ensure_ascii=False, allow_nan=False))
+            for g, p in zip(geoms_json, props)
+        ))
+        f.write("]}")
+
+def write_json_fragments(path, fragments):
+    # objet {clé: fragment JSON déjà sérialisé}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{" + ", ".join("%s: %s" % (json.dumps(k, ensure_ascii=False), v) for k, v in fragments.items()) + "}")
+
+def write_arrow(path, table: pa.Table):
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+def geoarrow_wkb_field(name: str, epsg: int) -> pa.Field:
+    # extension GeoArrow déclarée par métadonnées : lisible par @loaders.gl/arrow sans dépendance côté serveur
+    return pa.field(name, pa.binary(), metadata={
+        "ARROW:extension:name": "geoarrow.wkb",
+        "ARROW:extension:metadata": json.dumps({"crs": f"EPSG:{epsg}"}),
+    })
+
+def to_naive_seconds(s: pd.Series) -> pd.Series:
+    if s.dt.tz is not None:
+        s = s.dt.tz_convert(None)
+    return s.astype("datetime64[s]")
 
 def safe_num(s):
     return pd.to_numeric(s, errors="coerce")
@@ -85,12 +124,15 @@ traffic["speed"] = safe_num(traffic["speed"])
 traffic["speedRelative"] = safe_num(traffic["speedRelative"])
 
 traffic["vehicles_row"] = (traffic["entered"] + traffic["left"]) / 2.0
+# produits pondérés calculés en amont : l'agrégation reste une somme groupée vectorisée (NaN ignorés)
+traffic["w_speed_row"] = traffic["speed"] * traffic["vehicles_row"]
+traffic["w_sprel_row"] = traffic["speedRelative"] * traffic["vehicles_row"]
 gcols = ["id", "begin", "end"]
 
 totals = traffic.groupby(gcols, as_index=False).agg(
     vehicles=("vehicles_row", "sum"),
-    w_speed_num=("speed", lambda s: float(np.nansum(s * traffic.loc[s.index, "vehicles_row"]))),
-    w_sprel_num=("speedRelative", lambda s: float(np.nansum(s * traffic.loc[s.index, "vehicles_row"]))),
+    w_speed_num=("w_speed_row", "sum"),
+    w_sprel_num=("w_sprel_row", "sum"),
     w_den=("vehicles_row", "sum"),
 )
 totals["speed"] = np.where(totals["w_den"] > 0, totals["w_speed_num"] / totals["w_den"], np.nan)
@@ -98,7 +140,6 @@ totals["speedRelative"] = np.where(totals["w_den"] > 0, totals["w_sprel_num"] /
 totals = totals.drop(columns=["w_speed_num", "w_sprel_num", "w_den"])
 
 class_counts = traffic.pivot_table(index=gcols, columns="vclass", values="vehicles_row", aggfunc="sum", fill_value=0.0)
-traffic["w_speed_row"] = traffic["speed"] * traffic["vehicles_row"]
 class_speed_num = traffic.pivot_table(index=gcols, columns="vclass", values="w_speed_row", aggfunc="sum", fill_value=0.0)
 class_speed = class_speed_num / class_counts.replace({0.0: np.nan})
 class_speed.columns = [f"{c}_s" for c in class_speed.columns]
@@ -116,48 +157,56 @@ print("rows avec geometry non nulle:", traffic_geo["geometry"].notna().sum())
 
 # ========= EXPORTS =========
 # A) Bâtiments
-buildings_gj = decode_wkb_to_geojson_features(buildings, id_col="PK", geom_col="geometry", extra_props=["HEIGHT", "POP"], reproject=True)
-write_json(BUILDINGS_OUT, buildings_gj)
+b_valid, b_geoms = decode_geoms(buildings, geom_col="geometry", reproject=True)
+write_feature_collection(BUILDINGS_OUT, shapely.to_geojson(b_geoms), column_records(b_valid, ["PK", "HEIGHT", "POP"]))
+del b_valid, b_geoms
 
 # B) Routes
-roads_gj = decode_wkb_to_geojson_features(roads, id_col="id", geom_col="geometry", extra_props=[], reproject=True)
-write_json(ROADS_OUT, roads_gj)
+roads_valid, roads_geoms = decode_geoms(roads, geom_col="geometry", reproject=True)
+roads_geojson = shapely.to_geojson(roads_geoms)   # sérialisation GEOS vectorisée
+write_feature_collection(ROADS_OUT, roads_geojson, column_records(roads_valid, ["id"]))
+roads_geom = dict(zip(roads_valid["id"].tolist(), roads_geojson.tolist()))
+write_json_fragments(ROADS_GEOM_OUT, roads_geom)
+# même géométrie en WKB (GeoArrow) pour la sortie Arrow IPC de /api/map/traffic
+write_arrow(ROADS_WKB_OUT, pa.Table.from_arrays(
+    [pa.array(roads_valid["id"].tolist(), pa.string()), pa.array(shapely.to_wkb(roads_geoms).tolist(), pa.binary())],
+    schema=pa.schema([pa.field("id", pa.string()), geoarrow_wkb_field("geometry", DST_EPSG)]),
+))
 
 # C) Trafic : on exporte même sans géométrie (geometry: null) pour préserver la timeline
 classes = sorted(traffic["vclass"].dropna().unique().tolist())
-traffic_features = []
-for _, row in traffic_geo.iterrows():
-    g_json = None
-    if pd.notna(row["geometry"]):
-        g = from_wkb(row["geometry"])
-        if g is not None:
-            g = reproject_geom(g)
-            g_json = mapping(g)
-
-    props = {
-        "id": row["id"],
-        "begin": to_iso_seconds(row["begin"]),
-        "end": to_iso_seconds(row["end"]),
-        "vehicles": float(row["vehicles"]) if pd.notna(row["vehicles"]) else None,
-        "speed": float(row["speed"]) if pd.notna(row["speed"]) else None,
-        "speedRelative": float(row["speedRelative"]) if pd.notna(row["speedRelative"]) else None,
-    }
-    for cls in classes:
-        cval = row.get(cls, np.nan)
-        sval = row.get(f"{cls}_s", np.nan)
-        props[cls] = float(cval) if pd.notna(cval) else None
-        props[f"{cls}_s"] = float(sval) if pd.notna(sval) else None
-
-    traffic_features.append({"type": "Feature", "geometry": g_json, "properties": props})
-
-traffic_gj = {"type": "FeatureCollection", "features": traffic_features}
-write_json(TRAFFIC_OUT, traffic_gj)
+num_cols = ["vehicles", "speed", "speedRelative"] + [c for cls in classes for c in (cls, f"{cls}_s")]
+props_df = traffic_geo.reindex(columns=["id", "begin", "end"] + num_cols)
+props_df["begin"] = to_naive_seconds(props_df["begin"]).dt.strftime("%Y-%m-%dT%H:%M:%S")
+props_df["end"] = to_naive_seconds(props_df["end"]).dt.strftime("%Y-%m-%dT%H:%M:%S")
+props_df[num_cols] = props_df[num_cols].astype("float64")
+traffic_props = column_records(props_df, list(props_df.columns))
+del props_df
+# la géométrie ne dépend que de l'id : on réutilise le fragment GeoJSON de la route
+write_feature_collection(TRAFFIC_OUT, [roads_geom.get(p["id"]) for p in traffic_props], traffic_props)
+del traffic_props
+
+# C bis) Enregistrements en Arrow IPC, sans géométrie (jointe par id avec roads_geom.json)
+traffic_cols = agg.reindex(columns=["id", "begin", "end"] + num_cols)
+traffic_cols["id"] = traffic_cols["id"].astype("category")   # -> dictionary<int32, string>
+traffic_cols["begin"] = to_naive_seconds(traffic_cols["begin"])
+traffic_cols["end"] = to_naive_seconds(traffic_cols["end"])
+# float32 suffit (comptages moyens au demi-véhicule près, vitesses) : moitié moins d'octets
+traffic_cols[num_cols] = traffic_cols[num_cols].astype("float32")
+# tri par begin : une fenêtre temporelle = une plage contiguë de lignes (pages du memory-map,
+# row groups Parquet dont les stats min/max begin/end permettent d'écarter le reste)
+traffic_cols = traffic_cols.sort_values(["begin", "end", "id"], kind="stable")
+traffic_table = pa.Table.from_pandas(traffic_cols, preserve_index=False)
+write_arrow(TRAFFIC_RECORDS_OUT, traffic_table)
+pq.write_table(traffic_table, TRAFFIC_RECORDS_PARQUET_OUT, row_group_size=TRAFFIC_ROW_GROUP_SIZE,
+               compression="zstd", use_dictionary=True, write_statistics=True)
+del traffic_table
 
 # D) ⚠️ NEW: Intervalles “bruts” issus DIRECTEMENT du parquet trafic (garanti complet)
 uni = traffic[["begin", "end"]].dropna().drop_duplicates().sort_values(["begin", "end"])
 intervals = [{"begin": to_iso_seconds(b), "end": to_iso_seconds(e)} for b, e in zip(uni["begin"], uni["end"])]
 write_json(INTERVALS_OUT, {"intervals": intervals})
 
-print("\nExport OK :", BUILDINGS_OUT, ROADS_OUT, TRAFFIC_OUT, INTERVALS_OUT)
+print("\nExport OK :", BUILDINGS_OUT, ROADS_OUT, ROADS_GEOM_OUT, ROADS_WKB_OUT, TRAFFIC_OUT, TRAFFIC_RECORDS_OUT, TRAFFIC_RECORDS_PARQUET_OUT, INTERVALS_OUT)
 print("Bornes parquet :", to_iso_seconds(traffic['begin'].min()), "→", to_iso_seconds(traffic['end'].max()))
 print("Nb intervalles (parquet) :", len(intervals))
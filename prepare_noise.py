@@ -18,39 +18,184 @@ Usage:
 
 from __future__ import annotations
 import argparse
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import orjson
 import pandas as pd
+from pandas.api.types import is_numeric_dtype, is_object_dtype, is_string_dtype
 import geopandas as gpd
+import pyogrio
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import shapely
+from pyproj import Transformer
 from pathlib import Path
+try:
+    import duckdb
+except ImportError:  # optionnel : dédoublonnage/tri parallèle sur les gros volumes
+    duckdb = None
+try:
+    import dask_geopandas
+except ImportError:  # optionnel : reprojection partitionnée des très gros cadastres
+    dask_geopandas = None
+
+BUILDING_COLS = ["PK", "HEIGHT", "POP"]
+DASK_MIN_ROWS = 2_000_000  # seuil au-delà duquel la reprojection passe par dask-geopandas (si installé)
+
+def to_wgs84(gdf: gpd.GeoDataFrame, workers: int | None = None) -> gpd.GeoDataFrame:
+    """Équivalent de to_crs(4326) : coordonnées à plat, transformées par tranches en parallèle."""
+    if gdf.crs.equals(4326):
+        return gdf
+    geoms = gdf.geometry.to_numpy()
+    if shapely.has_z(geoms).any():
+        return gdf.to_crs(4326)
+    if dask_geopandas is not None and len(gdf) >= DASK_MIN_ROWS:
+        # très gros cadastres : une partition par cœur, reprojetées indépendamment
+        parts = dask_geopandas.from_geopandas(gdf, npartitions=workers or os.cpu_count() or 1)
+        return parts.to_crs(4326).compute()
+    coords = shapely.get_coordinates(geoms)
+    xs, ys = np.ascontiguousarray(coords[:, 0]), np.ascontiguousarray(coords[:, 1])
+    src = gdf.crs
+
+    def transform(part: slice):
+        # PROJ relâche le GIL ; un Transformer par thread (contexte PROJ non partagé)
+        Transformer.from_crs(src, 4326, always_xy=True).transform(xs[part], ys[part], inplace=True)
+
+    workers = workers or os.cpu_count() or 1
+    step = max(-(-len(xs) // workers), 1)
+    with ThreadPoolExecutor(workers) as ex:
+        list(ex.map(transform, [slice(i, i + step) for i in range(0, len(xs), step)]))
+    geoms = shapely.set_coordinates(geoms.copy(), np.column_stack([xs, ys]))
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=4326))
 
 def read_buildings(path: str) -> gpd.GeoDataFrame:
+    # ne lit que les colonnes utiles (+ geometry) : moins d'I/O et de WKB à décoder
     if path.lower().endswith(".parquet"):
-        gdf = gpd.read_parquet(path)
+        available = pq.read_schema(path).names
+        gdf = gpd.read_parquet(path, columns=[c for c in BUILDING_COLS if c in available] + ["geometry"])
     else:
-        gdf = gpd.read_file(path)
+        available = pyogrio.read_info(path)["fields"]
+        gdf = pyogrio.read_dataframe(path, columns=[c for c in BUILDING_COLS if c in available], read_geometry=True)
     if "PK" not in gdf.columns:
         raise ValueError("Le fichier bâtiments doit contenir une colonne 'PK' (identifiant bâtiment).")
     if gdf.crs is None:
         # Ajuste ce CRS si tu connais le CRS source exact
         gdf = gdf.set_crs(3857, allow_override=True)
-    gdf = gdf.to_crs(4326)
-    # on garde les colonnes utiles: PK, HEIGHT, POP, geometry (les autres ne gênent pas)
+    gdf = to_wgs84(gdf)
     return gdf
 
-def read_noise(path: str) -> pd.DataFrame:
+def read_noise(path: str, columns: list[str] | None = None, not_null: tuple[str, ...] = ()) -> pd.DataFrame:
+    """Mesures de bruit ; columns/not_null sont appliqués à la lecture quand le format le permet."""
     if path.lower().endswith(".parquet"):
-        df = pd.read_parquet(path)
+        # projection + filtre poussés dans le scan Arrow (colonnes et row groups inutiles jamais décodés)
+        dataset = ds.dataset(path, format="parquet")
+        names = dataset.schema.names
+        cols = [c for c in columns if c in names] if columns else None
+        filt = None
+        for c in not_null:
+            if c in names:
+                filt = ds.field(c).is_valid() if filt is None else filt & ds.field(c).is_valid()
+        df = dataset.to_table(columns=cols, filter=filt).to_pandas()
     elif path.lower().endswith(".csv"):
-        df = pd.read_csv(path)
+        df = pd.read_csv(path, usecols=(lambda c: c in columns) if columns else None)
     else:
         # tente lecture générique (xls, etc.)
         if path.lower().endswith((".xlsx", ".xls")):
-            df = pd.read_excel(path)
+            df = pd.read_excel(path, usecols=(lambda c: c in columns) if columns else None)
         else:
             raise ValueError(f"Format non supporté pour le bruit: {path}")
     return df
 
+def _exact_cast(s: pd.Series, dtype: np.dtype) -> bool:
+    """Vrai si s.astype(dtype) est sans perte (aller-retour identique)."""
+    if s.dtype == dtype or not np.issubdtype(s.dtype, np.integer) or np.issubdtype(dtype, np.integer):
+        return True
+    values = s.to_numpy()
+    with np.errstate(invalid="ignore"):
+        return bool((values.astype(dtype).astype(s.dtype) == values).all())
+
+def join_keys(left: pd.Series, right: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """Clés de jointure de même type : numérique commun si possible (hash join int64), sinon str catégoriel."""
+    if is_numeric_dtype(left) and is_numeric_dtype(right):
+        try:
+            common = np.promote_types(left.dtype, right.dtype)
+        except TypeError:
+            pass  # dtype d'extension (Int64, ...) : repli sur str
+        else:
+            # int64/uint64 ou entier/flottant -> float64 : au-delà de 2**53 des id distincts se confondraient
+            if all(_exact_cast(k, common) for k in (left, right)):
+                return left.astype(common), right.astype(common)
+    # repli str : un seul jeu de catégories pour les deux côtés -> le join compare des codes entiers
+    left, right = left.astype(str), right.astype(str)
+    shared = pd.CategoricalDtype(pd.Index(left.unique()).union(pd.Index(right.unique())))
+    return left.astype(shared), right.astype(shared)
+
+DUCKDB_MIN_ROWS = 5_000_000  # en dessous, pandas suffit
+
+def dedup_order_duckdb(df: pd.DataFrame, key_cols: list[str]) -> np.ndarray:
+    """Positions des lignes gardées (dernière par clé), dans l'ordre de tri : DuckDB en parallèle.
+    Seules les clés passent par Arrow, la géométrie reste côté pandas."""
+    keys = pa.Table.from_pandas(df[key_cols], preserve_index=False)
+    keys = keys.append_column("_pos", pa.array(np.arange(len(df), dtype=np.int64)))
+    cols = ", ".join('"%s"' % c.replace('"', '""') for c in key_cols)
+    con = duckdb.connect()
+    try:
+        con.register("t", keys)
+        return con.execute(
+            f"SELECT _pos FROM t QUALIFY row_number() OVER (PARTITION BY {cols} ORDER BY _pos DESC) = 1 "
+            f"ORDER BY {cols}, _pos"
+        ).fetchnumpy()["_pos"]
+    finally:
+        con.close()
+
+PARQUET_ROW_GROUP_SIZE = 50_000
+
+def write_geojson(gdf: gpd.GeoDataFrame, path: Path) -> None:
+    """FeatureCollection écrite en un passage : géométries sérialisées par GEOS (shapely.to_geojson,
+    vectorisé), propriétés par orjson ; NaN/NaT -> null, timestamps en ISO UTC."""
+    props = gdf.drop(columns=gdf.geometry.name)
+    for c in props.columns:
+        if isinstance(props[c].dtype, pd.DatetimeTZDtype):
+            props[c] = props[c].dt.tz_convert("UTC").dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    records = props.astype(object).where(props.notna(), None).to_dict("records")
+    geoms = shapely.to_geojson(gdf.geometry.to_numpy())
+    with open(path, "wb") as f:
+        f.write(b'{"type":"FeatureCollection","features":[')
+        f.write(b",".join(
+            b'{"type":"Feature","properties":%s,"geometry":%s}' % (orjson.dumps(p), g.encode() if g else b"null")
+            for p, g in zip(records, geoms)
+        ))
+        f.write(b"]}")
+
+def hilbert_order(geoms: gpd.GeoSeries) -> np.ndarray:
+    """Positions triées (stable) selon la distance de Hilbert ; géométries manquantes/vides en fin."""
+    valid = (~geoms.isna() & ~geoms.is_empty).to_numpy()
+    dist = np.full(len(geoms), np.iinfo(np.int64).max, dtype=np.int64)
+    if valid.any():
+        dist[valid] = geoms[valid].hilbert_distance().to_numpy()
+    return np.argsort(dist, kind="stable")
+
 def coerce_ts(col):
-    return pd.to_datetime(col, utc=True, errors="coerce")
+    if isinstance(col.dtype, pd.DatetimeTZDtype):
+        return col.dt.tz_convert("UTC")
+    if pd.api.types.is_datetime64_dtype(col):
+        return col.dt.tz_localize("UTC")
+    if not (is_object_dtype(col) or is_string_dtype(col)):
+        return pd.to_datetime(col, utc=True, errors="coerce")  # numérique : conversion générique
+    # texte : parseur ISO8601 en C ; l'inférence générique ne sert qu'aux valeurs non ISO
+    ts = pd.to_datetime(col, utc=True, format="ISO8601", errors="coerce", cache=True)
+    retry = ts.isna() & col.notna()
+    if retry.any():
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)  # « Could not infer format » attendu ici
+            other = pd.to_datetime(col[retry], utc=True, errors="coerce")
+        # fusion à la résolution la plus fine des deux (l'affectation en place entre résolutions échoue)
+        unit = max(ts.dt.unit, other.dt.unit, key=["s", "ms", "us", "ns"].index)
+        ts = ts.dt.as_unit(unit).where(~retry, other.dt.as_unit(unit))
+    return ts
 
 def main():
     ap = argparse.ArgumentParser()
@@ -66,7 +211,8 @@ def main():
 
     # 1) charge
     b_gdf = read_buildings(args.buildings)
-    n_df = read_noise(args.noise)
+    join_cols = [args.pk_col, args.begin_col, args.end_col] + args.vars
+    n_df = read_noise(args.noise, columns=join_cols, not_null=(args.begin_col, args.end_col))
 
     # 2) vérifs colonnes
     required_noise_cols = {args.pk_col, args.begin_col, args.end_col}
@@ -79,39 +225,32 @@ def main():
         raise ValueError(f"Variables bruit absentes: {missing_vars}. Reçues: {list(n_df.columns)}")
 
     # 3) normalisation temps
-    n_df = n_df.copy()
-    n_df[args.begin_col] = coerce_ts(n_df[args.begin_col])
-    n_df[args.end_col]   = coerce_ts(n_df[args.end_col])
-    # écarte les lignes sans intervalle valide
-    n_df = n_df[n_df[args.begin_col].notna() & n_df[args.end_col].notna()]
+    n_df = n_df.assign(**{args.begin_col: coerce_ts(n_df[args.begin_col]),
+                          args.end_col: coerce_ts(n_df[args.end_col])})
+    # écarte les lignes sans intervalle valide (nulls déjà filtrés à la lecture parquet ; restent les NaT de parsing)
+    n_df = n_df.dropna(subset=[args.begin_col, args.end_col])
     if n_df.empty:
         raise ValueError("Aucune ligne de bruit valide après parsing des timestamps.")
 
     # 4) join avec géométrie (left join sur PK)
-    join_cols = [args.pk_col, args.begin_col, args.end_col] + args.vars
-    n_small = n_df[join_cols].copy()
-    # assure type du PK compatible
-    b_gdf["_PK_key_"] = b_gdf[args.pk_col].astype(str)
-    n_small["_PK_key_"] = n_small[args.pk_col].astype(str)
-
-    gdf = b_gdf[["_PK_key_", "geometry", "HEIGHT", "POP"]].merge(
-        n_small.drop(columns=[args.pk_col]),
-        on="_PK_key_",
-        how="right"
-    )
+    # assure type du PK compatible ; join direct sur l'index des bâtiments (pas de colonne clé temporaire)
+    b_key, n_key = join_keys(b_gdf[args.pk_col], n_df[args.pk_col])
+    b_small = b_gdf[[c for c in ("geometry", "HEIGHT", "POP") if c in b_gdf.columns]].set_axis(b_key, axis=0)
+    gdf = n_df[join_cols].assign(**{args.pk_col: n_key}).join(b_small, on=args.pk_col, how="left")
     gdf = gpd.GeoDataFrame(gdf, geometry="geometry", crs=4326)
-    # remet le nom PK original
-    gdf[args.pk_col] = gdf["_PK_key_"]
-    gdf = gdf.drop(columns=["_PK_key_"])
 
     # 5) ordonne colonnes
     front_cols = [args.pk_col, args.begin_col, args.end_col] + args.vars + ["HEIGHT", "POP", "geometry"]
     existing = [c for c in front_cols if c in gdf.columns]
     gdf = gdf[existing]
 
-    # 6) tri & dédoublonnage léger
-    gdf = gdf.sort_values([args.pk_col, args.begin_col, args.end_col])
-    gdf = gdf.drop_duplicates(subset=[args.pk_col, args.begin_col, args.end_col], keep="last")
+    # 6) dédoublonnage (hash, garde la dernière occurrence) puis tri stable des seuls survivants
+    key_cols = [args.pk_col, args.begin_col, args.end_col]
+    if duckdb is not None and len(gdf) >= DUCKDB_MIN_ROWS:
+        gdf = gdf.iloc[dedup_order_duckdb(gdf, key_cols)]
+    else:
+        gdf = gdf.drop_duplicates(subset=key_cols, keep="last")
+        gdf = gdf.sort_values(key_cols, kind="stable")
 
     # 7) export
     out_parquet = Path(args.out_parquet)
@@ -119,8 +258,12 @@ def main():
     out_parquet.parent.mkdir(parents=True, exist_ok=True)
     out_geojson.parent.mkdir(parents=True, exist_ok=True)
 
-    gdf.to_parquet(out_parquet, index=False)
-    gdf.to_file(out_geojson, driver="GeoJSON")
+    # GeoParquet 1.1 : colonne bbox de couverture + row groups spatialement compacts (ordre de Hilbert)
+    # -> les stats min/max de bbox par row group permettent au lecteur d'en sauter la plupart
+    gdf.iloc[hilbert_order(gdf.geometry)].to_parquet(
+        out_parquet, index=False, compression="zstd", geometry_encoding="WKB",
+        schema_version="1.1.0", write_covering_bbox=True, row_group_size=PARQUET_ROW_GROUP_SIZE)
+    write_geojson(gdf, out_geojson)
 
     # petit résumé
     tmin = gdf[args.begin_col].min()
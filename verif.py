@@ -1,46 +1,82 @@
-import json
-from datetime import datetime
+import numpy as np
+import orjson
+import pandas as pd
+try:
+    import ijson
+except ImportError:  # optionnel : sans ijson, le fichier est chargé en entier
+    ijson = None
+try:
+    import simdjson
+except ImportError:  # optionnel : parseur SIMD, accès paresseux aux seules properties
+    simdjson = None
+
+PROP_KEYS = ['begin', 'end', 'start', 'timestamp', 'time', 'datetime',
+             'date', 'day', 'hour', 'heure', 'h']
+
+def truthy(s):
+    s = s.astype(object)
+    return s.notna() & s.where(s.notna(), False).astype(bool)
+
+def first_of(df, *keys):
+    # équivalent vectorisé de props.get(a) or props.get(b) or ...
+    out = df[keys[0]]
+    for k in keys[1:]:
+        out = out.where(truthy(out), df[k])
+    return out.where(truthy(out), None)
 
 def parse_iso(s):
-    if not s: return None
-    s = s.replace(' ', 'T')
-    if s.endswith('Z'): s = s[:-1] + '+00:00'
+    # une colonne entière en un appel ; les valeurs invalides deviennent NaT
+    # (le parseur ISO8601 de pandas accepte déjà l'espace comme séparateur et le suffixe Z)
+    s = s.astype('string')
     try:
-        return datetime.fromisoformat(s)
-    except Exception:
-        return None
+        return pd.to_datetime(s, format='ISO8601', errors='coerce')
+    except ValueError:
+        # fuseaux mélangés : tout ramener en UTC
+        return pd.to_datetime(s, format='ISO8601', errors='coerce', utc=True)
 
-def get_interval(props):
+def get_intervals(props):
+    """(begin, end) par ligne, mêmes priorités que l'ancien get_interval par feature."""
+    begin, end = parse_iso(props['begin']), parse_iso(props['end'])
     # begin/end
-    b = parse_iso(props.get('begin')); e = parse_iso(props.get('end'))
-    if b or e: return b, e
-    # start/end
-    b = parse_iso(props.get('start')); e = parse_iso(props.get('end'))
-    if b or e: return b, e
+    todo = begin.isna() & end.isna()
+    # start/end (end déjà essayé ci-dessus)
+    start = parse_iso(props['start'])
+    begin = begin.mask(todo, start)
+    todo &= start.isna()
     # timestamp
-    ts = parse_iso(props.get('timestamp') or props.get('time') or props.get('datetime'))
-    if ts: return ts, ts
-    # date + hour
-    d = props.get('date') or props.get('day'); h = props.get('hour') or props.get('heure') or props.get('h')
-    if d and h is not None:
-        try:
-            h = int(h)
-            return parse_iso(f"{d}T{h:02d}:00:00"), parse_iso(f"{d}T{h:02d}:59:59")
-        except: pass
-    # date only
-    if d:
-        return parse_iso(f"{d}T00:00:00"), parse_iso(f"{d}T23:59:59")
-    return None, None
-
-with open('traffic_agg.geojson','r',encoding='utf-8') as f:
-    gj = json.load(f)
-
-min_begin = None
-max_end = None
-for ft in gj.get('features', []):
-    b, e = get_interval(ft.get('properties', {}) or {})
-    if b and (min_begin is None or b < min_begin): min_begin = b
-    if e and (max_end   is None or e > max_end):   max_end   = e
+    ts = parse_iso(first_of(props, 'timestamp', 'time', 'datetime'))
+    begin, end = begin.mask(todo, ts), end.mask(todo, ts)
+    todo &= ts.isna()
+    # date + hour, sinon date seule
+    d = first_of(props, 'date', 'day')
+    h = pd.to_numeric(first_of(props, 'hour', 'heure', 'h'), errors='coerce')
+    has_h = h.notna() & d.notna()
+    # heure ajoutée en timedelta plutôt que formatée ligne par ligne ; hors [0, 23] -> NaT comme avant
+    hours = np.trunc(h)
+    ok = ~has_h | hours.between(0, 23)
+    day = parse_iso(d.where(truthy(d)).astype('string') + 'T00:00:00')
+    b_dh = (day + pd.to_timedelta(hours.where(has_h & ok, 0), unit='h')).where(ok)
+    e_dh = b_dh + pd.to_timedelta(np.where(has_h, 59 * 60 + 59, 23 * 3600 + 59 * 60 + 59), unit='s')
+    begin, end = begin.mask(todo, b_dh), end.mask(todo, e_dh)
+    return begin, end
+
+def load_properties(path):
+    # seules les properties sont utiles : simdjson (vue paresseuse) ou ijson (flux)
+    # les extraient sans construire les géométries ; sinon orjson charge tout
+    if simdjson is not None:
+        doc = simdjson.Parser().load(path)
+        feats = doc.get('features') or []
+        return [p.as_dict() if p else {} for p in (ft.get('properties') for ft in feats)]
+    with open(path, 'rb') as f:
+        if ijson is not None:
+            return [p or {} for p in ijson.items(f, 'features.item.properties', use_float=True)]
+        gj = orjson.loads(f.read())
+    return [ft.get('properties', {}) or {} for ft in gj.get('features', [])]
+
+props = pd.DataFrame.from_records(load_properties('traffic_agg.geojson'), columns=PROP_KEYS)
+b, e = get_intervals(props)
+min_begin = b.min() if b.notna().any() else None
+max_end = e.max() if e.notna().any() else None
 
 print('min_begin =', min_begin)
 print('max_end   =', max_end)